@@ -1,40 +1,333 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-from flask_mysqldb import MySQL
-from models import Base, User, StudySession, MoodLevel, WellnessEntry, StudyGoal
-from sqlalchemy import create_engine
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, abort
+from flask.json.provider import JSONProvider
+from models import Base, User, StudySession, StudyDailyRollup, MoodLevel, MOOD_SCORES, WellnessEntry, StudyGoal
+from utils import (
+    analyze_sentiment, get_study_analytics, calculate_productivity_score, generate_study_recommendations,
+    add_to_daily_rollup, remove_from_daily_rollup, ROLLUP_ADD_SQL
+)
+from sqlalchemy import create_engine, func, delete, literal_column
 from sqlalchemy.orm import scoped_session, sessionmaker
+from pymysqlpool.pool import Pool
+import pymysql
 import bcrypt
 import os
 from dotenv import load_dotenv
 from functools import wraps
+import hashlib
+import binascii
 import re
 import datetime
+import math
+import concurrent.futures
+import jinja2
+import msgspec
+import orjson
+import decimal
+import threading
+from typing import List, Optional
+from cachetools import TTLCache
+from types import MappingProxyType
 
 # Load environment variables
 load_dotenv()
 
+def _orjson_default(obj):
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+class ORJSONProvider(JSONProvider):
+    """JSON provider backed by orjson; dates and datetimes are emitted as ISO 8601."""
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-here')
 
+# Template caching: compile once, share bytecode between workers
+# (Jinja's default cache directory is private to the current user)
+app.jinja_env.bytecode_cache = jinja2.FileSystemBytecodeCache()
+
 # MySQL configurations
 app.config['MYSQL_HOST'] = os.getenv('MYSQL_HOST', 'localhost')
 app.config['MYSQL_USER'] = os.getenv('MYSQL_USER', 'mindfit_user')
 app.config['MYSQL_PASSWORD'] = os.getenv('MYSQL_PASSWORD', 'supersecret')
 app.config['MYSQL_DB'] = os.getenv('MYSQL_DB', 'mindfit')
-app.config['MYSQL_CURSORCLASS'] = 'DictCursor'
 
-# Initialize MySQL
-mysql = MySQL(app)
+# Password hashing configuration
+app.config['BCRYPT_COST'] = int(os.getenv('BCRYPT_COST', 12))
+
+# bcrypt releases the GIL, so hashing on a shared pool keeps workers from serializing on it
+HASH_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count())
+
+# Connection pool shared across requests for the raw SQL routes
+POOL = Pool(
+    host=app.config['MYSQL_HOST'],
+    user=app.config['MYSQL_USER'],
+    password=app.config['MYSQL_PASSWORD'],
+    db=app.config['MYSQL_DB'],
+    min_size=5,
+    max_size=20,
+    cursorclass=pymysql.cursors.DictCursor,
+    ping_check=True  # like pool_pre_ping below: reconnect after wait_timeout or a server restart
+)
+_pool_lock = threading.Lock()
+_pool_started = False
+
+@app.before_request
+def start_pool():
+    """Open the pool's initial connections on the first request rather than at import."""
+    global _pool_started
+    if not _pool_started:
+        with _pool_lock:
+            if not _pool_started:
+                POOL.init()
+                _pool_started = True
+
+def release_conn(conn, cur):
+    """
+    Close the cursor, end any open read snapshot and return the connection to POOL.
+    The connection may already be dead, so a failure here must not keep it from the pool.
+    """
+    try:
+        cur.close()
+        conn.rollback()
+    except pymysql.err.Error:
+        pass
+    finally:
+        POOL.release(conn)
 
 # SQLAlchemy configuration
 DB_URI = f"mysql+pymysql://{app.config['MYSQL_USER']}:{app.config['MYSQL_PASSWORD']}@{app.config['MYSQL_HOST']}/{app.config['MYSQL_DB']}"
-engine = create_engine(DB_URI)
+engine = create_engine(
+    DB_URI,
+    pool_size=20,
+    max_overflow=40,
+    pool_recycle=1800,  # recycle before MySQL's wait_timeout drops idle connections
+    pool_pre_ping=True,
+    query_cache_size=1200
+)
 db_session = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
 
+# Pool for running independent queries concurrently, each on its own thread-local session.
+# It is shared by every request in the process and each dashboard load submits six tasks, so
+# it is sized from the engine pool by default: enough for a few dashboards at once while
+# leaving the overflow connections to request threads. Tune QUERY_WORKERS for the server's
+# request concurrency.
+QUERY_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.getenv('QUERY_WORKERS', engine.pool.size()))
+)
+
+def run_in_worker_session(fn, *args):
+    """Run fn(*args, session) with the worker thread's scoped session, then release it."""
+    try:
+        return fn(*args, db_session)
+    finally:
+        db_session.remove()
+
+# Per-user caches for the dashboard's aggregate helpers, cleared when the user's sessions change.
+# Each maps user_id -> {subkey: value}, so invalidation is a single pop per cache.
+# They live in each worker process and invalidation only reaches the process that made the
+# change, so other workers may serve a stale value for up to the cache's TTL.
+_ANALYTICS = TTLCache(maxsize=10000, ttl=60)
+_PRODUCTIVITY = TTLCache(maxsize=10000, ttl=300)
+_RECOMMENDATIONS = TTLCache(maxsize=10000, ttl=300)
+_CACHE_LOCK = threading.Lock()
+_CACHE_GENERATIONS = {}  # user_id -> number of invalidations so far
+
+def cached_per_user(cache, user_id, subkey, fn, *args):
+    """Return the user's cached value for subkey, computing it with fn(*args) on a miss."""
+    with _CACHE_LOCK:
+        value = cache.get(user_id, {}).get(subkey)
+        generation = _CACHE_GENERATIONS.get(user_id, 0)
+    if value is None:
+        value = fn(*args)
+        with _CACHE_LOCK:
+            # Drop the result if the user's data changed while it was being computed
+            if _CACHE_GENERATIONS.get(user_id, 0) == generation:
+                cache.setdefault(user_id, {})[subkey] = value
+    return value
+
+def invalidate_user_caches(user_id):
+    with _CACHE_LOCK:
+        _CACHE_GENERATIONS[user_id] = _CACHE_GENERATIONS.get(user_id, 0) + 1
+        for cache in (_ANALYTICS, _PRODUCTIVITY, _RECOMMENDATIONS):
+            cache.pop(user_id, None)
+
+# Sentiment scoring runs in the background so model inference stays off the request path
+SENTIMENT_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+def update_session_sentiment(session_id, user_id, notes, session):
+    """Score a study session's notes and store the result on the row."""
+    try:
+        sentiment = analyze_sentiment(notes)
+        if sentiment['label'] == 'NEUTRAL':
+            # No model available (or it failed), so leave sentiment_score NULL
+            return
+        remove_from_daily_rollup(session, session_id, user_id)
+        session.query(StudySession).filter(StudySession.id == session_id).update({
+            StudySession.sentiment_score: sentiment['score'] if sentiment['label'] == 'POSITIVE' else -sentiment['score']
+        })
+        add_to_daily_rollup(session, session_id)
+        session.commit()
+        invalidate_user_caches(user_id)
+    except Exception as e:
+        session.rollback()
+        app.logger.error(f'Error scoring sentiment for session {session_id}: {str(e)}')
+
+# Mood level (1-5) display text
+MOOD_TEXT = MappingProxyType({
+    1: 'Very Stressed',
+    2: 'Stressed',
+    3: 'Neutral',
+    4: 'Relaxed',
+    5: 'Very Relaxed'
+})
+
+# Font Awesome icon per subject, 'book' when not listed
+SUBJECT_ICONS = MappingProxyType({
+    'math': 'calculator',
+    'science': 'flask',
+    'history': 'landmark',
+    'english': 'book-open',
+    'programming': 'code',
+    'art': 'palette',
+    'music': 'music'
+})
+
+class SessionOut(msgspec.Struct):
+    """JSON shape of a study session returned by the API."""
+    id: int
+    subject: str
+    date: datetime.date
+    start_time: Optional[datetime.time]
+    duration_minutes: int
+    mood_level: Optional[int]
+    mood_text: str
+    notes: Optional[str]
+    tags: List[str]
+    completed: bool
+    created_at: Optional[datetime.datetime]
+    updated_at: Optional[datetime.datetime]
+
+def session_out(session_data):
+    return SessionOut(
+        id=session_data.id,
+        subject=session_data.subject,
+        date=session_data.date,
+        start_time=session_data.start_time,
+        duration_minutes=session_data.duration_minutes,
+        mood_level=session_data.mood_level,
+        mood_text=MOOD_TEXT.get(session_data.mood_level, 'Unknown'),
+        notes=session_data.notes,
+        tags=session_data.tags or [],
+        completed=session_data.completed,
+        created_at=session_data.created_at,
+        updated_at=session_data.updated_at
+    )
+
+def session_json():
+    """SQL expression rendering a study session row as a JSON object in the same shape as SessionOut."""
+    return func.json_object(
+        'id', StudySession.id,
+        'subject', StudySession.subject,
+        'date', func.date_format(StudySession.date, '%Y-%m-%d'),
+        'start_time', func.time_format(StudySession.start_time, '%H:%i:%s'),
+        'duration_minutes', StudySession.duration_minutes,
+        'mood_level', StudySession.mood_level,
+        'mood_text', func.coalesce(func.elt(StudySession.mood_level, *MOOD_TEXT.values()), 'Unknown'),
+        'notes', StudySession.notes,
+        'tags', func.coalesce(StudySession.tags, func.json_array()),
+        'completed', literal_column('CAST(study_sessions.completed IS TRUE AS JSON)'),
+        'created_at', func.date_format(StudySession.created_at, '%Y-%m-%dT%H:%i:%s'),
+        'updated_at', func.date_format(StudySession.updated_at, '%Y-%m-%dT%H:%i:%s')
+    )
+
+class Page:
+    """One page of query results, with the attributes the pagination templates use."""
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.pages = math.ceil(total / per_page)
+    
+    @property
+    def has_prev(self):
+        return self.page > 1
+    
+    @property
+    def has_next(self):
+        return self.page < self.pages
+    
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+    
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+    
+    def iter_pages(self, left_edge=2, left_current=2, right_current=5, right_edge=2):
+        """Page numbers to link to, with None where a run of pages is skipped."""
+        last = 0
+        for num in range(1, self.pages + 1):
+            if (num <= left_edge
+                    or self.page - left_current - 1 < num < self.page + right_current
+                    or num > self.pages - right_edge):
+                if last + 1 != num:
+                    yield None
+                yield num
+                last = num
+
+def parse_tags(tags):
+    """Normalize tags given as a list or a comma-separated string into a list."""
+    if isinstance(tags, list):
+        return tags
+    return [tag.strip() for tag in (tags or '').split(',') if tag.strip()]
+
+# Characters with special meaning in a boolean-mode FULLTEXT search
+_FULLTEXT_OPERATORS_RE = re.compile(r'[+\-<>()~*"@]')
+
+def subject_search(term):
+    """Filter on subject using the FULLTEXT index, falling back to LIKE for words
+    shorter than InnoDB's minimum indexed token size (3)."""
+    words = _FULLTEXT_OPERATORS_RE.sub(' ', term).split()
+    if not words or any(len(word) < 3 for word in words):
+        return StudySession.subject.ilike(f'%{term}%')
+    return StudySession.subject.match(' '.join(f'+{word}*' for word in words))
+
 # Email validation regex
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\Z')
+
 def is_valid_email(email):
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(pattern, email))
+    return _EMAIL_RE.match(email) is not None
+
+def _verify(pw_bytes: bytes, stored_hash: bytes) -> bool:
+    return HASH_EXECUTOR.submit(bcrypt.checkpw, pw_bytes, stored_hash).result()
+
+# Hashes created by hash_password() are bcrypt over a SHA-256 pre-hash and carry this prefix
+PREHASH_PREFIX = b'sha256$'
+
+def prehash(pw_bytes):
+    """Normalize a password to 64 hex bytes so bcrypt's 72-byte input limit never truncates it."""
+    return binascii.hexlify(hashlib.sha256(pw_bytes).digest())
+
+def hash_password(pw_bytes):
+    hashed = HASH_EXECUTOR.submit(
+        bcrypt.hashpw, prehash(pw_bytes), bcrypt.gensalt(rounds=app.config['BCRYPT_COST'])
+    ).result()
+    return PREHASH_PREFIX + hashed
+
+def check_password(pw_bytes, stored_hash):
+    """Verify a password against a pre-hashed or legacy plain bcrypt hash."""
+    if stored_hash.startswith(PREHASH_PREFIX):
+        return _verify(prehash(pw_bytes), stored_hash[len(PREHASH_PREFIX):])
+    return _verify(pw_bytes, stored_hash)
 
 # Login required decorator
 def login_required(f):
@@ -64,12 +357,22 @@ def login():
             flash('Please enter both email and password', 'error')
             return redirect(url_for('login'))
             
-        cur = mysql.connection.cursor()
+        conn = POOL.get_conn()
+        cur = conn.cursor()
         try:
             cur.execute("SELECT * FROM users WHERE email = %s", (email,))
             user = cur.fetchone()
             
-            if user and bcrypt.checkpw(password, user['password'].encode('utf-8')):
+            stored_hash = user['password'].encode('utf-8') if user else None
+            if user and check_password(password, stored_hash):
+                # Move legacy hashes to the pre-hashed format while we have the password
+                if not stored_hash.startswith(PREHASH_PREFIX):
+                    cur.execute(
+                        "UPDATE users SET password = %s WHERE id = %s",
+                        (hash_password(password), user['id'])
+                    )
+                    conn.commit()
+                
                 session['user_id'] = user['id']
                 session['name'] = user['name']
                 session['email'] = user['email']
@@ -78,7 +381,7 @@ def login():
                 flash('Invalid email or password', 'error')
                 return redirect(url_for('login'))
         finally:
-            cur.close()
+            release_conn(conn, cur)
     
     return render_template('login.html')
 
@@ -111,65 +414,92 @@ def register():
             return redirect(url_for('register'))
             
         # Hash password
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        hashed_password = hash_password(password.encode('utf-8'))
         
-        cur = mysql.connection.cursor()
+        conn = POOL.get_conn()
+        cur = conn.cursor()
         try:
-            # Check if email already exists
-            cur.execute("SELECT id FROM users WHERE email = %s", (email,))
-            if cur.fetchone():
-                flash('Email already registered', 'error')
-                return redirect(url_for('register'))
-            
-            # Create new user
+            # Create new user; the unique key on email rejects duplicates
             cur.execute(
                 "INSERT INTO users (name, email, password) VALUES (%s, %s, %s)",
                 (name, email, hashed_password)
             )
-            mysql.connection.commit()
+            conn.commit()
             
             flash('Registration successful! Please log in.', 'success')
             return redirect(url_for('login'))
             
+        except pymysql.err.IntegrityError:
+            flash('Email already registered', 'error')
+            return redirect(url_for('register'))
+            
         except Exception as e:
-            mysql.connection.rollback()
             flash('An error occurred. Please try again.', 'error')
             return redirect(url_for('register'))
             
         finally:
-            cur.close()
+            release_conn(conn, cur)
     
     return render_template('register.html')
 
+# The dashboard helpers run on worker threads whose session is removed before the result is
+# used, so they return plain rows (attribute access like the models, no lazy loads) not ORM objects
+def get_recent_sessions(user_id, session):
+    return session.query(
+        StudySession.id, StudySession.subject, StudySession.duration,
+        StudySession.pre_mood, StudySession.post_mood, StudySession.created_at
+    ).filter(
+        StudySession.user_id == user_id
+    ).order_by(StudySession.created_at.desc()).limit(5).all()
+
+def get_recent_entries(user_id, session):
+    return session.query(
+        WellnessEntry.id, WellnessEntry.mood_level, WellnessEntry.stress_level,
+        WellnessEntry.energy_level, WellnessEntry.sleep_hours, WellnessEntry.created_at
+    ).filter(
+        WellnessEntry.user_id == user_id
+    ).order_by(WellnessEntry.created_at.desc()).limit(5).all()
+
+def get_active_goals(user_id, session):
+    return session.query(
+        StudyGoal.id, StudyGoal.title, StudyGoal.description, StudyGoal.target_hours,
+        StudyGoal.current_hours, StudyGoal.deadline, StudyGoal.is_completed, StudyGoal.created_at
+    ).filter(
+        StudyGoal.user_id == user_id,
+        StudyGoal.is_completed == False
+    ).order_by(StudyGoal.deadline).all()
+
 @app.route('/dashboard')
 @login_required
 def dashboard():
     """Main dashboard showing study analytics and wellness overview."""
     try:
-        # Get study analytics for the last 7 days
-        analytics = get_study_analytics(session['user_id'], days=7)
-        
-        # Calculate productivity score
-        productivity_score = calculate_productivity_score(session['user_id'], db_session)
-        
-        # Get recent study sessions
-        recent_sessions = db_session.query(StudySession).filter(
-            StudySession.user_id == session['user_id']
-        ).order_by(StudySession.created_at.desc()).limit(5).all()
-        
-        # Get recent wellness entries
-        recent_entries = db_session.query(WellnessEntry).filter(
-            WellnessEntry.user_id == session['user_id']
-        ).order_by(WellnessEntry.created_at.desc()).limit(5).all()
-        
-        # Get active study goals
-        active_goals = db_session.query(StudyGoal).filter(
-            StudyGoal.user_id == session['user_id'],
-            StudyGoal.is_completed == False
-        ).order_by(StudyGoal.deadline).all()
+        user_id = session['user_id']
+        today = datetime.date.today()
         
-        # Get personalized recommendations
-        recommendations = generate_study_recommendations(session['user_id'], db_session)
+        # The dashboard queries are independent, so run them concurrently
+        futures = {
+            # Study analytics for the last 7 days
+            'analytics': QUERY_EXECUTOR.submit(
+                cached_per_user, _ANALYTICS, user_id, (7, today),
+                run_in_worker_session, get_study_analytics, user_id, 7
+            ),
+            'productivity_score': QUERY_EXECUTOR.submit(
+                cached_per_user, _PRODUCTIVITY, user_id, today,
+                run_in_worker_session, calculate_productivity_score, user_id
+            ),
+            'recent_sessions': QUERY_EXECUTOR.submit(run_in_worker_session, get_recent_sessions, user_id),
+            'recent_entries': QUERY_EXECUTOR.submit(run_in_worker_session, get_recent_entries, user_id),
+            'active_goals': QUERY_EXECUTOR.submit(run_in_worker_session, get_active_goals, user_id),
+            # Personalized recommendations
+            'recommendations': QUERY_EXECUTOR.submit(
+                cached_per_user, _RECOMMENDATIONS, user_id, today,
+                run_in_worker_session, generate_study_recommendations, user_id
+            ),
+        }
+        concurrent.futures.wait(futures.values())
+        results = {name: future.result() for name, future in futures.items()}
+        analytics = results['analytics']
         
         # Calculate total study time this week (in hours)
         total_study_hours = analytics.get('total_study_hours', 0)
@@ -180,11 +510,11 @@ def dashboard():
         return render_template(
             'dashboard.html',
             analytics=analytics,
-            productivity_score=productivity_score,
-            recent_sessions=recent_sessions,
-            recent_entries=recent_entries,
-            active_goals=active_goals,
-            recommendations=recommendations,
+            productivity_score=results['productivity_score'],
+            recent_sessions=results['recent_sessions'],
+            recent_entries=results['recent_entries'],
+            active_goals=results['active_goals'],
+            recommendations=results['recommendations'],
             total_study_hours=total_study_hours,
             avg_stress=avg_stress,
             MoodLevel=MoodLevel
@@ -195,86 +525,34 @@ def dashboard():
         flash('An error occurred while loading the dashboard. Please try again.', 'error')
         return redirect(url_for('index'))
 
-@app.route('/study-session/new', methods=['GET', 'POST'])
-@login_required
-def new_study_session():
-    """Create a new study session."""
-    if request.method == 'POST':
-        try:
-            subject = request.form.get('subject', '').strip()
-            duration = int(request.form.get('duration', 0))
-            pre_mood = request.form.get('pre_mood')
-            post_mood = request.form.get('post_mood')
-            notes = request.form.get('notes', '').strip()
-            
-            # Validate inputs
-            if not subject or duration <= 0:
-                flash('Please provide a subject and valid duration', 'error')
-                return redirect(url_for('new_study_session'))
-            
-            # Analyze sentiment from notes if provided
-            sentiment = {"label": "NEUTRAL", "score": 0.5}
-            if notes:
-                sentiment = analyze_sentiment(notes)
-            
-            # Create new study session
-            session = StudySession(
-                user_id=session['user_id'],
-                subject=subject,
-                duration=duration,
-                pre_mood=MoodLevel(pre_mood) if pre_mood else None,
-                post_mood=MoodLevel(post_mood) if post_mood else None,
-                notes=notes,
-                sentiment_score=sentiment['score'] if sentiment['label'] == 'POSITIVE' else -sentiment['score']
-            )
-            
-            db_session.add(session)
-            db_session.commit()
-            
-            flash('Study session logged successfully!', 'success')
-            return redirect(url_for('dashboard'))
-            
-        except ValueError as ve:
-            db_session.rollback()
-            flash('Invalid input values. Please check your entries.', 'error')
-            app.logger.error(f'ValueError in new_study_session: {str(ve)}')
-        except Exception as e:
-            db_session.rollback()
-            flash('An error occurred while saving your study session.', 'error')
-            app.logger.error(f'Error in new_study_session: {str(e)}')
-    
-    # For GET request or if there was an error
-    return render_template('study_session/new.html', MoodLevel=MoodLevel)
-
-@app.route('/study-session/<int:session_id>')
-@login_required
-def view_study_session(session_id):
-    """View details of a specific study session."""
-    session = db_session.query(StudySession).filter(
-        StudySession.id == session_id,
-        StudySession.user_id == session['user_id']
-    ).first_or_404()
-    
-    return render_template('study_session/view.html', session=session)
-
 @app.route('/study-session/<int:session_id>/delete', methods=['POST'])
 @login_required
 def delete_study_session(session_id):
     """Delete a study session."""
-    session = db_session.query(StudySession).filter(
-        StudySession.id == session_id,
-        StudySession.user_id == session['user_id']
-    ).first_or_404()
-    
     try:
-        db_session.delete(session)
-        db_session.commit()
-        flash('Study session deleted successfully!', 'success')
+        # Delete by id and owner directly instead of loading the row first
+        remove_from_daily_rollup(db_session, session_id, session['user_id'])
+        deleted = db_session.execute(
+            delete(StudySession).where(
+                StudySession.id == session_id,
+                StudySession.user_id == session['user_id']
+            )
+        ).rowcount
+        if deleted:
+            db_session.commit()
+            invalidate_user_caches(session['user_id'])
+        else:
+            db_session.rollback()
     except Exception as e:
         db_session.rollback()
         flash('An error occurred while deleting the study session.', 'error')
         app.logger.error(f'Error deleting study session: {str(e)}')
+        return redirect(url_for('dashboard'))
     
+    if not deleted:
+        abort(404)
+    
+    flash('Study session deleted successfully!', 'success')
     return redirect(url_for('dashboard'))
 
 @app.route('/api/study-sessions')
@@ -283,7 +561,10 @@ def get_study_sessions():
     """API endpoint to get study sessions for the current user (for charts)."""
     try:
         days = int(request.args.get('days', 7))  # Default to 7 days
-        analytics = get_study_analytics(session['user_id'], days=days)
+        analytics = cached_per_user(
+            _ANALYTICS, session['user_id'], (days, datetime.date.today()),
+            get_study_analytics, session['user_id'], days, db_session
+        )
         
         return jsonify({
             'success': True,
@@ -305,38 +586,37 @@ def get_study_sessions():
 @app.route('/add_session', methods=['POST'])
 @login_required
 def add_session():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
+    subject = request.form.get('subject', '').strip()
+    duration = request.form.get('duration', 0, type=int)
+    pre_mood = request.form.get('pre_mood', '').strip()
+    post_mood = request.form.get('post_mood', '').strip()
+    notes = request.form.get('notes', '').strip()
+    
+    if not subject or duration <= 0:
+        flash('Subject and valid duration are required', 'error')
+        return redirect(url_for('dashboard'))
         
-    if request.method == 'POST':
-        subject = request.form.get('subject', '').strip()
-        duration = request.form.get('duration', 0, type=int)
-        pre_mood = request.form.get('pre_mood', '').strip()
-        post_mood = request.form.get('post_mood', '').strip()
-        notes = request.form.get('notes', '').strip()
+    conn = POOL.get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO study_sessions 
+            (user_id, subject, duration, pre_mood, post_mood, post_mood_score, notes)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (
+            session['user_id'], subject, duration, 
+            pre_mood or None, post_mood or None,
+            MOOD_SCORES.get(MoodLevel.from_name(post_mood)), notes or None
+        ))
+        cur.execute(ROLLUP_ADD_SQL, {'session_id': cur.lastrowid})
+        conn.commit()
+        invalidate_user_caches(session['user_id'])
+        flash('Study session added successfully!', 'success')
+    except Exception as e:
+        flash('Failed to add study session', 'error')
+    finally:
+        release_conn(conn, cur)
         
-        if not subject or duration <= 0:
-            flash('Subject and valid duration are required', 'error')
-            return redirect(url_for('dashboard'))
-            
-        cur = mysql.connection.cursor()
-        try:
-            cur.execute("""
-                INSERT INTO study_sessions 
-                (user_id, subject, duration, pre_mood, post_mood, notes)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (
-                session['user_id'], subject, duration, 
-                pre_mood or None, post_mood or None, notes or None
-            ))
-            mysql.connection.commit()
-            flash('Study session added successfully!', 'success')
-        except Exception as e:
-            mysql.connection.rollback()
-            flash('Failed to add study session', 'error')
-        finally:
-            cur.close()
-            
     return redirect(url_for('dashboard'))
 
 @app.route('/logout')
@@ -351,25 +631,26 @@ def study_sessions():
     Display a paginated list of study sessions with filtering and sorting options.
     """
     # Pagination
-    page = request.args.get('page', 1, type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
     per_page = 10
     
-    # Base query
-    query = db_session.query(StudySession).filter(StudySession.user_id == session['user_id'])
-    
-    # Apply filters
+    # Collect filters so the listing and the statistics share them
+    filters = [StudySession.user_id == session['user_id']]
     subject_filter = request.args.get('subject', '').strip()
     date_from = request.args.get('date_from')
     date_to = request.args.get('date_to')
     
     if subject_filter:
-        query = query.filter(StudySession.subject.ilike(f'%{subject_filter}%'))
+        filters.append(subject_search(subject_filter))
     
     if date_from:
-        query = query.filter(StudySession.date >= datetime.datetime.strptime(date_from, '%Y-%m-%d').date())
+        filters.append(StudySession.date >= datetime.date.fromisoformat(date_from))
     
     if date_to:
-        query = query.filter(StudySession.date <= datetime.datetime.strptime(date_to, '%Y-%m-%d').date())
+        filters.append(StudySession.date <= datetime.date.fromisoformat(date_to))
+    
+    # Base query
+    query = db_session.query(StudySession).filter(*filters)
     
     # Apply sorting
     sort_by = request.args.get('sort', 'date_desc')
@@ -382,18 +663,26 @@ def study_sessions():
     else:  # Default: date_desc
         query = query.order_by(StudySession.date.desc(), StudySession.start_time.desc())
     
+    # Calculate statistics, including the row count pagination needs, in one aggregate
+    total_sessions, total_minutes, avg_mood = db_session.query(
+        func.count(StudySession.id),
+        func.coalesce(func.sum(StudySession.duration_minutes), 0),
+        func.avg(StudySession.mood_level)
+    ).filter(*filters).one()
+    
     # Paginate the results
-    sessions = query.paginate(page=page, per_page=per_page, error_out=False)
+    sessions = Page(
+        query.limit(per_page).offset((page - 1) * per_page).all(),
+        page, per_page, total_sessions
+    )
     
-    # Calculate statistics
     stats = {
-        'total_sessions': query.count(),
-        'total_hours': query.with_entities(db_session.func.sum(StudySession.duration_minutes)).scalar() or 0 // 60,
-        'total_minutes': query.with_entities(db_session.func.sum(StudySession.duration_minutes)).scalar() or 0 % 60,
+        'total_sessions': total_sessions,
+        'total_hours': total_minutes // 60,
+        'total_minutes': total_minutes % 60,
     }
     
     # Calculate average mood (if available)
-    avg_mood = query.with_entities(db_session.func.avg(StudySession.mood_level)).scalar()
     if avg_mood is not None:
         if avg_mood <= 1.5:
             stats['average_mood'] = 'Very Stressed'
@@ -426,31 +715,9 @@ def view_study_session(session_id):
         flash('Session not found or access denied.', 'danger')
         return redirect(url_for('study_sessions'))
     
-    # Convert mood level to text for display
-    mood_texts = {
-        1: 'Very Stressed',
-        2: 'Stressed',
-        3: 'Neutral',
-        4: 'Relaxed',
-        5: 'Very Relaxed'
-    }
-    
-    # Get subject icon based on subject or default to 'book'
-    subject_icons = {
-        'math': 'calculator',
-        'science': 'flask',
-        'history': 'landmark',
-        'english': 'book-open',
-        'programming': 'code',
-        'art': 'palette',
-        'music': 'music'
-    }
-    
-    session_data.mood_text = mood_texts.get(session_data.mood_level, 'N/A')
-    session_data.subject_icon = subject_icons.get(session_data.subject.lower(), 'book')
-    
-    # Parse tags if they exist
-    session_data.tags = session_data.tags.split(',') if session_data.tags else []
+    # Mood text and subject icon for display
+    session_data.mood_text = MOOD_TEXT.get(session_data.mood_level, 'N/A')
+    session_data.subject_icon = SUBJECT_ICONS.get(session_data.subject.lower(), 'book')
     
     return render_template('view_session.html', session=session_data)
 
@@ -462,11 +729,11 @@ def new_study_session():
         # Extract form data
         subject = request.form.get('subject')
         duration = int(request.form.get('duration', 0))
-        date = datetime.datetime.strptime(request.form.get('date'), '%Y-%m-%d').date()
-        start_time = datetime.datetime.strptime(request.form.get('start_time'), '%H:%M').time()
+        date = datetime.date.fromisoformat(request.form.get('date'))
+        start_time = datetime.time.fromisoformat(request.form.get('start_time'))
         mood_level = int(request.form.get('mood_level', 3))
         notes = request.form.get('notes', '').strip()
-        tags = request.form.get('tags', '').strip()
+        tags = parse_tags(request.form.get('tags', ''))
         completed = 'completed' in request.form
         
         # Create new session
@@ -480,12 +747,18 @@ def new_study_session():
             notes=notes,
             tags=tags,
             completed=completed,
-            created_at=datetime.datetime.now(),
             updated_at=datetime.datetime.now()
         )
         
         db_session.add(new_session)
+        db_session.flush()
+        add_to_daily_rollup(db_session, new_session.id)
         db_session.commit()
+        invalidate_user_caches(session['user_id'])
+        
+        # sentiment_score stays NULL until the background scoring finishes
+        if notes:
+            SENTIMENT_EXECUTOR.submit(run_in_worker_session, update_session_sentiment, new_session.id, session['user_id'], notes)
         
         flash('Study session logged successfully!', 'success')
         return redirect(url_for('study_sessions'))
@@ -516,25 +789,21 @@ def api_get_sessions():
     """
     try:
         # Pagination
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 10, type=int), 50)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = max(min(request.args.get('per_page', 10, type=int), 50), 1)
         
         # Base query
         query = db_session.query(StudySession).filter(StudySession.user_id == session['user_id'])
         
         # Apply filters
         if 'subject' in request.args:
-            query = query.filter(StudySession.subject.ilike(f'%{request.args["subject"]}%'))
+            query = query.filter(subject_search(request.args['subject']))
             
         if 'date_from' in request.args:
-            query = query.filter(StudySession.date >= datetime.datetime.strptime(
-                request.args['date_from'], '%Y-%m-%d'
-            ).date())
+            query = query.filter(StudySession.date >= datetime.date.fromisoformat(request.args['date_from']))
             
         if 'date_to' in request.args:
-            query = query.filter(StudySession.date <= datetime.datetime.strptime(
-                request.args['date_to'], '%Y-%m-%d'
-            ).date())
+            query = query.filter(StudySession.date <= datetime.date.fromisoformat(request.args['date_to']))
         
         # Apply sorting
         sort_field = request.args.get('sort', 'date')
@@ -550,47 +819,31 @@ def api_get_sessions():
         sort_field = sort_field.desc() if sort_order == 'desc' else sort_field.asc()
         query = query.order_by(sort_field)
         
-        # Paginate results
-        paginated_sessions = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Paginate results; MySQL renders each row as JSON so nothing is hydrated here
+        total = query.order_by(None).count()
+        rows = query.with_entities(session_json()).limit(per_page).offset((page - 1) * per_page).all()
+        pages = math.ceil(total / per_page)
         
         # Prepare response
-        sessions_data = [{
-            'id': session.id,
-            'subject': session.subject,
-            'date': session.date.isoformat(),
-            'start_time': session.start_time.isoformat() if session.start_time else None,
-            'duration_minutes': session.duration_minutes,
-            'mood_level': session.mood_level,
-            'mood_text': {
-                1: 'Very Stressed',
-                2: 'Stressed',
-                3: 'Neutral',
-                4: 'Relaxed',
-                5: 'Very Relaxed'
-            }.get(session.mood_level, 'Unknown'),
-            'notes': session.notes,
-            'tags': session.tags.split(',') if session.tags else [],
-            'completed': session.completed,
-            'created_at': session.created_at.isoformat() if session.created_at else None,
-            'updated_at': session.updated_at.isoformat() if session.updated_at else None
-        } for session in paginated_sessions.items]
-        
-        response = {
-            'success': True,
-            'data': sessions_data,
-            'pagination': {
-                'page': paginated_sessions.page,
-                'per_page': paginated_sessions.per_page,
-                'total_pages': paginated_sessions.pages,
-                'total_items': paginated_sessions.total,
-                'has_prev': paginated_sessions.has_prev,
-                'has_next': paginated_sessions.has_next,
-                'prev_num': paginated_sessions.prev_num,
-                'next_num': paginated_sessions.next_num
-            }
+        pagination = {
+            'page': page,
+            'per_page': per_page,
+            'total_pages': pages,
+            'total_items': total,
+            'has_prev': page > 1,
+            'has_next': page < pages,
+            'prev_num': page - 1 if page > 1 else None,
+            'next_num': page + 1 if page < pages else None
         }
+        payload = b''.join([
+            b'{"success":true,"data":[',
+            ','.join(row[0] for row in rows).encode('utf-8'),
+            b'],"pagination":',
+            orjson.dumps(pagination),
+            b'}'
+        ])
         
-        return jsonify(response), 200
+        return Response(payload, status=200, mimetype='application/json')
         
     except Exception as e:
         return jsonify({
@@ -614,31 +867,12 @@ def api_get_session(session_id):
                 'error': 'Session not found or access denied'
             }), 404
             
-        response = {
+        payload = msgspec.json.encode({
             'success': True,
-            'data': {
-                'id': session_data.id,
-                'subject': session_data.subject,
-                'date': session_data.date.isoformat(),
-                'start_time': session_data.start_time.isoformat() if session_data.start_time else None,
-                'duration_minutes': session_data.duration_minutes,
-                'mood_level': session_data.mood_level,
-                'mood_text': {
-                    1: 'Very Stressed',
-                    2: 'Stressed',
-                    3: 'Neutral',
-                    4: 'Relaxed',
-                    5: 'Very Relaxed'
-                }.get(session_data.mood_level, 'Unknown'),
-                'notes': session_data.notes,
-                'tags': session_data.tags.split(',') if session_data.tags else [],
-                'completed': session_data.completed,
-                'created_at': session_data.created_at.isoformat() if session_data.created_at else None,
-                'updated_at': session_data.updated_at.isoformat() if session_data.updated_at else None
-            }
-        }
+            'data': session_out(session_data)
+        })
         
-        return jsonify(response), 200
+        return Response(payload, status=200, mimetype='application/json')
         
     except Exception as e:
         return jsonify({
@@ -666,19 +900,21 @@ def api_create_session():
         new_session = StudySession(
             user_id=session['user_id'],
             subject=data['subject'],
-            date=datetime.datetime.strptime(data['date'], '%Y-%m-%d').date(),
-            start_time=datetime.datetime.strptime(data.get('start_time', '00:00'), '%H:%M').time() if 'start_time' in data else None,
+            date=datetime.date.fromisoformat(data['date']),
+            start_time=datetime.time.fromisoformat(data['start_time']) if 'start_time' in data else None,
             duration_minutes=data['duration_minutes'],
             mood_level=data.get('mood_level', 3),  # Default to neutral
             notes=data.get('notes', ''),
-            tags=','.join(data.get('tags', [])),
+            tags=parse_tags(data.get('tags', [])),
             completed=data.get('completed', False),
-            created_at=datetime.datetime.now(),
             updated_at=datetime.datetime.now()
         )
         
         db_session.add(new_session)
+        db_session.flush()
+        add_to_daily_rollup(db_session, new_session.id)
         db_session.commit()
+        invalidate_user_caches(session['user_id'])
         
         response = {
             'success': True,
@@ -713,13 +949,16 @@ def api_update_session(session_id):
             
         data = request.get_json()
         
+        # Take the old values out of the rollup; the new ones are added back after the flush
+        remove_from_daily_rollup(db_session, session_id, session['user_id'])
+        
         # Update fields if provided
         if 'subject' in data:
             session_data.subject = data['subject']
         if 'date' in data:
-            session_data.date = datetime.datetime.strptime(data['date'], '%Y-%m-%d').date()
+            session_data.date = datetime.date.fromisoformat(data['date'])
         if 'start_time' in data:
-            session_data.start_time = datetime.datetime.strptime(data['start_time'], '%H:%M').time()
+            session_data.start_time = datetime.time.fromisoformat(data['start_time'])
         if 'duration_minutes' in data:
             session_data.duration_minutes = data['duration_minutes']
         if 'mood_level' in data:
@@ -727,13 +966,16 @@ def api_update_session(session_id):
         if 'notes' in data:
             session_data.notes = data['notes']
         if 'tags' in data:
-            session_data.tags = ','.join(data['tags']) if isinstance(data['tags'], list) else data['tags']
+            session_data.tags = parse_tags(data['tags'])
         if 'completed' in data:
             session_data.completed = data['completed']
             
         session_data.updated_at = datetime.datetime.now()
         
+        db_session.flush()
+        add_to_daily_rollup(db_session, session_id)
         db_session.commit()
+        invalidate_user_caches(session['user_id'])
         
         response = {
             'success': True,
@@ -754,19 +996,23 @@ def api_update_session(session_id):
 def api_delete_session(session_id):
     """API endpoint to delete a study session"""
     try:
-        session_data = db_session.query(StudySession).filter(
-            StudySession.id == session_id,
-            StudySession.user_id == session['user_id']
-        ).first()
+        remove_from_daily_rollup(db_session, session_id, session['user_id'])
+        deleted = db_session.execute(
+            delete(StudySession).where(
+                StudySession.id == session_id,
+                StudySession.user_id == session['user_id']
+            )
+        ).rowcount
         
-        if not session_data:
+        if not deleted:
+            db_session.rollback()
             return jsonify({
                 'success': False,
                 'error': 'Session not found or access denied'
             }), 404
             
-        db_session.delete(session_data)
         db_session.commit()
+        invalidate_user_caches(session['user_id'])
         
         response = {
             'success': True,
@@ -787,48 +1033,46 @@ def api_delete_session(session_id):
 def api_get_session_stats():
     """API endpoint to get statistics about study sessions"""
     try:
-        # Base query for current user's sessions
-        query = db_session.query(StudySession).filter(
-            StudySession.user_id == session['user_id']
-        )
+        # Counts and totals come from the daily rollup (its day is StudySession.date);
+        # only the average mood needs the study_sessions rows themselves
+        rollup_filters = [StudyDailyRollup.user_id == session['user_id']]
+        mood_filters = [StudySession.user_id == session['user_id']]
         
         # Apply date filter if provided
         if 'date_from' in request.args:
-            query = query.filter(StudySession.date >= datetime.datetime.strptime(
-                request.args['date_from'], '%Y-%m-%d'
-            ).date())
+            date_from = datetime.date.fromisoformat(request.args['date_from'])
+            rollup_filters.append(StudyDailyRollup.day >= date_from)
+            mood_filters.append(StudySession.date >= date_from)
             
         if 'date_to' in request.args:
-            query = query.filter(StudySession.date <= datetime.datetime.strptime(
-                request.args['date_to'], '%Y-%m-%d'
-            ).date())
-        
-        # Get total sessions and time
-        total_sessions = query.count()
-        total_minutes = query.with_entities(
-            db_session.func.sum(StudySession.duration_minutes)
-        ).scalar() or 0
-        
-        # Calculate average mood
-        avg_mood = query.with_entities(
-            db_session.func.avg(StudySession.mood_level)
-        ).scalar()
-        
-        # Get sessions by day of week
-        sessions_by_day = db_session.query(
-            db_session.func.dayofweek(StudySession.date).label('day_of_week'),
-            db_session.func.count(StudySession.id).label('count')
-        ).filter(
-            StudySession.user_id == session['user_id']
+            date_to = datetime.date.fromisoformat(request.args['date_to'])
+            rollup_filters.append(StudyDailyRollup.day <= date_to)
+            mood_filters.append(StudySession.date <= date_to)
+        
+        query = db_session.query(StudyDailyRollup).filter(*rollup_filters)
+        session_count = func.sum(StudyDailyRollup.session_count)
+        
+        # Get total sessions and total time in one pass
+        total_sessions, total_minutes = query.with_entities(
+            func.coalesce(session_count, 0),
+            func.coalesce(func.sum(StudyDailyRollup.total_duration), 0)
+        ).one()
+        total_sessions, total_minutes = int(total_sessions), int(total_minutes)
+        
+        avg_mood = db_session.query(func.avg(StudySession.mood_level)).filter(*mood_filters).scalar()
+        
+        # Get sessions by day of week within the same date range
+        # (MySQL's WEEKDAY() is already 0-6 for Monday-Sunday)
+        sessions_by_day = query.with_entities(
+            func.weekday(StudyDailyRollup.day).label('day_of_week'),
+            session_count
         ).group_by('day_of_week').all()
         
         # Format day of week data
         days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
         sessions_by_day_formatted = [0] * 7
-        for day in sessions_by_day:
-            # SQLite uses 1-7 for Sunday-Saturday, convert to 0-6 Monday-Sunday
-            idx = (day[0] - 2) % 7
-            sessions_by_day_formatted[idx] = day[1]
+        for idx, count in sessions_by_day:
+            sessions_by_day_formatted[idx] = int(count)
         
         response = {
             'success': True,
@@ -842,11 +1086,11 @@ def api_get_session_stats():
                     'data': sessions_by_day_formatted
                 },
                 'sessions_by_subject': [
-                    {'subject': s[0], 'count': s[1]}
-                    for s in query.with_entities(
-                        StudySession.subject,
-                        db_session.func.count(StudySession.id)
-                    ).group_by(StudySession.subject).all()
+                    {'subject': subject, 'count': int(count)}
+                    for subject, count in query.with_entities(
+                        StudyDailyRollup.subject,
+                        session_count
+                    ).group_by(StudyDailyRollup.subject).having(session_count > 0).all()
                 ]
             }
         }
@@ -859,6 +1103,13 @@ def api_get_session_stats():
             'error': str(e)
         }), 400
 
+def precompile_templates():
+    """Parse and compile every template up front so the first render of each page is cheap."""
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+precompile_templates()
+
 @app.teardown_appcontext
 def shutdown_session(exception=None):
     db_session.remove()
@@ -1,4 +1,5 @@
-from app import app, mysql
+from app import app
+from utils import rebuild_daily_rollup
 from models import Base, User, StudySession, WellnessEntry, StudyGoal, WellnessTip, UserPreference, MoodLevel
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -57,7 +58,7 @@ def init_db():
             )
         ]
         
-        session.add_all(wellness_tips)
+        session.bulk_save_objects(wellness_tips)
         
         # Add a test user
         test_user = User(
@@ -71,7 +72,7 @@ def init_db():
         session.flush()  # To get the user ID
         
         # Add user preferences for test user
-        preferences = UserPreference(
+        session.execute(UserPreference.__table__.insert(), [dict(
             user_id=test_user.id,
             study_reminder_enabled=True,
             break_reminder_interval=50,
@@ -85,8 +86,7 @@ def init_db():
                 'sunday': [10, 15]
             },
             theme='light'
-        )
-        session.add(preferences)
+        )])
         
         # Add sample study sessions
         now = datetime.utcnow()
@@ -112,7 +112,7 @@ def init_db():
                 created_at=now - timedelta(days=2)
             )
         ]
-        session.add_all(study_sessions)
+        session.bulk_save_objects(study_sessions)
         
         # Add sample wellness entries
         wellness_entries = [
@@ -137,7 +137,7 @@ def init_db():
                 created_at=now - timedelta(days=2)
             )
         ]
-        session.add_all(wellness_entries)
+        session.bulk_save_objects(wellness_entries)
         
         # Add sample study goals
         study_goals = [
@@ -160,7 +160,11 @@ def init_db():
                 is_completed=True
             )
         ]
-        session.add_all(study_goals)
+        session.bulk_save_objects(study_goals)
+        
+        # Build the daily study rollup from the seeded sessions
+        session.flush()
+        rebuild_daily_rollup(session)
         
         # Commit all changes
         session.commit()
@@ -171,9 +175,6 @@ def init_db():
         print(f"Error initializing database: {e}")
     finally:
         session.close()
-        # Close any existing database connections
-        if 'mysql' in app.extensions:
-            app.mysql.connection.close()
 
 if __name__ == '__main__':
     with app.app_context():
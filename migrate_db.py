@@ -0,0 +1,73 @@
+from app import engine
+from models import Base
+from utils import rebuild_daily_rollup, backfill_mood_scores
+from sqlalchemy import inspect
+from sqlalchemy.orm import sessionmaker
+
+# Columns added to existing tables after their first release, as (table, column, MySQL column definition).
+# create_all only creates missing tables, so these are added with ALTER TABLE.
+COLUMNS = [
+    ('study_sessions', 'start_time', 'TIME NULL'),
+    ('study_sessions', 'completed', 'BOOLEAN DEFAULT FALSE'),
+    ('study_sessions', 'updated_at', 'TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'),
+    ('study_sessions', 'tags', 'JSON NULL'),
+    ('study_sessions', 'post_mood_score', 'SMALLINT NULL'),
+]
+
+# Indexes added to existing tables, as (table, index name, MySQL index definition)
+INDEXES = [
+    ('study_sessions', 'ix_ss_user_created_subject', 'INDEX ix_ss_user_created_subject (user_id, created_at, subject)'),
+    ('study_sessions', 'ft_ss_subject', 'FULLTEXT INDEX ft_ss_subject (subject)'),
+    ('study_sessions', 'ix_study_sessions_post_mood_score', 'INDEX ix_study_sessions_post_mood_score (post_mood_score)'),
+    ('wellness_entries', 'ix_we_user_created', 'INDEX ix_we_user_created (user_id, created_at)'),
+]
+
+def add_missing_columns(conn):
+    inspector = inspect(conn)
+    for table, column, definition in COLUMNS:
+        existing = {c['name'] for c in inspector.get_columns(table)}
+        if column not in existing:
+            print(f"Adding {table}.{column}...")
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def add_missing_indexes(conn):
+    inspector = inspect(conn)
+    for table, name, definition in INDEXES:
+        existing = {i['name'] for i in inspector.get_indexes(table)}
+        if name not in existing:
+            print(f"Adding index {name} on {table}...")
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD {definition}")
+
+def migrate_db():
+    """
+    Bring an existing database up to date with models.py without dropping data.
+    Every step checks the live schema first, so it is safe to run more than once.
+    """
+    print("Creating missing tables...")
+    Base.metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        add_missing_columns(conn)
+        add_missing_indexes(conn)
+
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    try:
+        # Fill post_mood_score for sessions written before the column existed
+        print("Backfilling mood scores...")
+        backfill_mood_scores(session)
+        
+        # Recompute the daily study rollup from the existing study sessions
+        print("Rebuilding daily study rollup...")
+        rebuild_daily_rollup(session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+    print("Database migrated successfully!")
+
+if __name__ == '__main__':
+    migrate_db()
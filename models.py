@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, TIMESTAMP, Float, Boolean, Enum, JSON
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import Column, Integer, SmallInteger, String, Text, ForeignKey, TIMESTAMP, Date, Time, Float, Boolean, Enum, JSON, Index
+from sqlalchemy.orm import relationship, declarative_base, synonym, validates
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.sql import func
 from flask_login import UserMixin
+import datetime
 import enum
 
 Base = declarative_base()
@@ -12,6 +14,23 @@ class MoodLevel(enum.Enum):
     NEUTRAL = "Neutral"
     RELAXED = "Relaxed"
     VERY_RELAXED = "Very Relaxed"
+    
+    @classmethod
+    def from_name(cls, name):
+        """Look up a member by name, as Enum(MoodLevel) columns store it, or None if unknown."""
+        return _MOOD_LEVEL_BY_NAME.get(name)
+
+_MOOD_LEVEL_BY_NAME = {member.name: member for member in MoodLevel}
+
+# Moods as 1-5 scores (1 = very stressed, 5 = very relaxed)
+MOOD_SCORES = {
+    MoodLevel.VERY_STRESSED: 1,
+    MoodLevel.STRESSED: 2,
+    MoodLevel.NEUTRAL: 3,
+    MoodLevel.RELAXED: 4,
+    MoodLevel.VERY_RELAXED: 5
+}
+MOODS_BY_SCORE = {score: mood for mood, score in MOOD_SCORES.items()}
 
 class User(Base, UserMixin):
     __tablename__ = 'users'
@@ -35,25 +54,94 @@ class User(Base, UserMixin):
 
 class StudySession(Base):
     __tablename__ = 'study_sessions'
+    __table_args__ = (
+        Index('ix_ss_user_created_subject', 'user_id', 'created_at', 'subject'),
+        Index('ft_ss_subject', 'subject', mysql_prefix='FULLTEXT'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     subject = Column(String(100), nullable=False)
     duration = Column(Integer, nullable=False)  # in minutes
+    start_time = Column(Time, nullable=True)
+    completed = Column(Boolean, default=False)
     pre_mood = Column(Enum(MoodLevel), nullable=True)
     post_mood = Column(Enum(MoodLevel), nullable=True)
+    post_mood_score = Column(SmallInteger, nullable=True, index=True)  # MOOD_SCORES[post_mood], kept in sync on write
     notes = Column(Text, nullable=True)
     sentiment_score = Column(Float, nullable=True)  # -1 to 1, negative to positive
+    tags = Column(JSON, nullable=True)  # list of tag strings
     created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
     
     # Relationship
-    user = relationship('User', back_populates='study_sessions')
+    user = relationship('User', back_populates='study_sessions', lazy='raise_on_sql')  # eager-load explicitly
+    
+    # Names used by the session views and API
+    duration_minutes = synonym('duration')
+    
+    @hybrid_property
+    def mood_level(self):
+        """post_mood as a 1-5 score."""
+        return MOOD_SCORES.get(self.post_mood)
+    
+    @mood_level.setter
+    def mood_level(self, value):
+        if value is None:
+            self.post_mood = None
+            return
+        try:
+            self.post_mood = MOODS_BY_SCORE[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"mood_level must be an integer from 1 to 5, got {value!r}")
+    
+    @mood_level.expression
+    def mood_level(cls):
+        return cls.post_mood_score
+    
+    @validates('post_mood')
+    def _sync_post_mood_score(self, key, value):
+        self.post_mood_score = MOOD_SCORES.get(value)
+        return value
+    
+    @hybrid_property
+    def date(self):
+        """Day the session was logged."""
+        return self.created_at.date() if self.created_at else None
+    
+    @date.setter
+    def date(self, value):
+        # Move created_at to the given day, keeping its time of day (now, for a new session)
+        time_of_day = self.created_at.time() if self.created_at else datetime.datetime.now().time()
+        self.created_at = datetime.datetime.combine(value, time_of_day)
+    
+    @date.expression
+    def date(cls):
+        return func.date(cls.created_at)
     
     def __repr__(self):
         return f"<StudySession(id={self.id}, user_id={self.user_id}, subject='{self.subject}')>"
 
+class StudyDailyRollup(Base):
+    """Per-user, per-day, per-subject study totals, kept in step with study_sessions."""
+    __tablename__ = 'study_daily_rollup'
+    
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    day = Column(Date, primary_key=True)  # DATE(study_sessions.created_at)
+    subject = Column(String(100), primary_key=True)
+    total_duration = Column(Integer, nullable=False, default=0)  # in minutes
+    session_count = Column(Integer, nullable=False, default=0)
+    sum_sentiment = Column(Float, nullable=False, default=0.0)
+    sentiment_count = Column(Integer, nullable=False, default=0)  # sessions with a sentiment_score
+    
+    def __repr__(self):
+        return f"<StudyDailyRollup(user_id={self.user_id}, day='{self.day}', subject='{self.subject}')>"
+
 class WellnessEntry(Base):
     __tablename__ = 'wellness_entries'
+    __table_args__ = (
+        Index('ix_we_user_created', 'user_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
@@ -66,7 +154,7 @@ class WellnessEntry(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())
     
     # Relationship
-    user = relationship('User', back_populates='wellness_entries')
+    user = relationship('User', back_populates='wellness_entries', lazy='raise_on_sql')  # eager-load explicitly
     
     def __repr__(self):
         return f"<WellnessEntry(id={self.id}, user_id={self.user_id}, mood='{self.mood_level}')>"
@@ -85,7 +173,7 @@ class StudyGoal(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())
     
     # Relationship
-    user = relationship('User', back_populates='study_goals')
+    user = relationship('User', back_populates='study_goals', lazy='raise_on_sql')  # eager-load explicitly
     
     def __repr__(self):
         return f"<StudyGoal(id={self.id}, title='{self.title}', progress='{self.current_hours}/{self.target_hours}')>"
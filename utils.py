@@ -2,63 +2,225 @@
 import os
 import json
 import random
+import threading
+from functools import lru_cache
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from models import MoodLevel, WellnessTip, StudySession, WellnessEntry
+from sqlalchemy import func, select, union_all, null, literal
+from models import MoodLevel, MOOD_SCORES, WellnessTip, StudySession, WellnessEntry, StudyDailyRollup
 
-# Sentiment analysis setup
-try:
-    from transformers import pipeline
-    sentiment_analyzer = pipeline("sentiment-analysis")
-except ImportError:
-    sentiment_analyzer = None
+# Sentiment analysis setup; the pipeline is built on first use, not at import
+SENTIMENT_MODEL = os.getenv("SENTIMENT_MODEL", "distilbert-base-uncased-finetuned-sst-2-english")
+_sentiment_analyzer = None  # False once we know the pipeline cannot be built
+_analyzer_lock = threading.Lock()
+
+def _get_analyzer():
+    """
+    Return the shared sentiment pipeline, building it on first call, or None if
+    transformers/torch are not installed or the model fails to load. Uses FP16 on
+    GPU and int8 dynamic quantization on CPU.
+    """
+    global _sentiment_analyzer
+    if _sentiment_analyzer is None:
+        with _analyzer_lock:
+            if _sentiment_analyzer is None:
+                try:
+                    import torch
+                    from transformers import pipeline
+                except ImportError:
+                    _sentiment_analyzer = False
+                    return None
+                
+                try:
+                    if torch.cuda.is_available():
+                        analyzer = pipeline("sentiment-analysis", model=SENTIMENT_MODEL, torch_dtype=torch.float16, device=0)
+                    else:
+                        analyzer = pipeline("sentiment-analysis", model=SENTIMENT_MODEL, device=-1)
+                        analyzer.model = torch.quantization.quantize_dynamic(
+                            analyzer.model, {torch.nn.Linear}, dtype=torch.qint8
+                        )
+                except Exception as e:
+                    # Don't retry the download/load on every request
+                    print(f"Error loading sentiment model: {e}")
+                    _sentiment_analyzer = False
+                    return None
+                _sentiment_analyzer = analyzer
+    return _sentiment_analyzer or None
+
+def _sentiment_result(result: Dict) -> Dict[str, float]:
+    return {
+        "label": result["label"],
+        "score": result["score"] if result["label"] == "POSITIVE" else 1 - result["score"]
+    }
+
+@lru_cache(maxsize=4096)
+def _cached_sentiment(text: str) -> Tuple[str, float]:
+    # Identical notes are common ("Good day"), so repeat texts skip the model.
+    # Exceptions propagate and are therefore never cached.
+    result = _sentiment_result(_get_analyzer()(text, truncation=True)[0])
+    return result["label"], result["score"]
 
 def analyze_sentiment(text: str) -> Dict[str, float]:
     """
     Analyze the sentiment of a given text using Hugging Face's sentiment analysis.
     Returns a dictionary with 'label' (POSITIVE/NEGATIVE) and 'score' (confidence).
     """
-    if not text or not sentiment_analyzer:
+    if not text:
         return {"label": "NEUTRAL", "score": 0.5}
     
     try:
-        result = sentiment_analyzer(text)[0]
-        return {
-            "label": result["label"],
-            "score": result["score"] if result["label"] == "POSITIVE" else 1 - result["score"]
-        }
+        if not _get_analyzer():
+            return {"label": "NEUTRAL", "score": 0.5}
+        label, score = _cached_sentiment(text)
+        return {"label": label, "score": score}
     except Exception as e:
         print(f"Error in sentiment analysis: {e}")
         return {"label": "NEUTRAL", "score": 0.5}
 
-def get_wellness_tips(stress_level: int, category: str = None) -> List[Dict]:
+def analyze_sentiments_batch(texts: List[str]) -> List[Dict[str, float]]:
     """
-    Get wellness tips based on stress level and optional category.
+    Analyze many texts with batched pipeline calls, e.g. when backfilling notes.
+    Returns one result per input, in order, in the same format as analyze_sentiment.
     """
-    tips = []
-    with Session(engine) as session:
-        query = session.query(WellnessTip).filter(
-            WellnessTip.min_stress_level <= stress_level,
-            WellnessTip.max_stress_level >= stress_level
-        )
-        
-        if category:
-            query = query.filter(WellnessTip.category == category.lower())
-        
-        tips = [{
+    results = [{"label": "NEUTRAL", "score": 0.5} for _ in texts]
+    indexes = [i for i, text in enumerate(texts) if text]
+    if not indexes:
+        return results
+    
+    try:
+        analyzer = _get_analyzer()
+        if not analyzer:
+            return results
+        outputs = analyzer([texts[i] for i in indexes], batch_size=32, truncation=True)
+    except Exception as e:
+        print(f"Error in batch sentiment analysis: {e}")
+        return results
+    
+    for i, output in zip(indexes, outputs):
+        results[i] = _sentiment_result(output)
+    return results
+
+# study_daily_rollup maintenance. The statements use DB-API (pyformat) parameters so they
+# run both through SQLAlchemy's exec_driver_sql and on a raw pymysql cursor.
+ROLLUP_ADD_SQL = """
+    INSERT INTO study_daily_rollup
+        (user_id, day, subject, total_duration, session_count, sum_sentiment, sentiment_count)
+    SELECT user_id, DATE(created_at), subject, duration, 1,
+           COALESCE(sentiment_score, 0), sentiment_score IS NOT NULL
+    FROM study_sessions
+    WHERE id = %(session_id)s
+    ON DUPLICATE KEY UPDATE
+        total_duration = total_duration + VALUES(total_duration),
+        session_count = session_count + VALUES(session_count),
+        sum_sentiment = sum_sentiment + VALUES(sum_sentiment),
+        sentiment_count = sentiment_count + VALUES(sentiment_count)
+"""
+
+ROLLUP_REMOVE_SQL = """
+    UPDATE study_daily_rollup r
+    JOIN study_sessions s
+        ON r.user_id = s.user_id AND r.day = DATE(s.created_at) AND r.subject = s.subject
+    SET r.total_duration = r.total_duration - s.duration,
+        r.session_count = r.session_count - 1,
+        r.sum_sentiment = r.sum_sentiment - COALESCE(s.sentiment_score, 0),
+        r.sentiment_count = r.sentiment_count - (s.sentiment_score IS NOT NULL)
+    WHERE s.id = %(session_id)s AND s.user_id = %(user_id)s
+"""
+
+ROLLUP_REBUILD_SQL = """
+    INSERT INTO study_daily_rollup
+        (user_id, day, subject, total_duration, session_count, sum_sentiment, sentiment_count)
+    SELECT user_id, DATE(created_at), subject, SUM(duration), COUNT(*),
+           COALESCE(SUM(sentiment_score), 0), COUNT(sentiment_score)
+    FROM study_sessions
+    GROUP BY user_id, DATE(created_at), subject
+"""
+
+def add_to_daily_rollup(session: Session, study_session_id: int) -> None:
+    """
+    Add a study session's current values to its (user, day, subject) rollup row.
+    Call after the session row has been flushed.
+    """
+    session.connection().exec_driver_sql(ROLLUP_ADD_SQL, {'session_id': study_session_id})
+
+def remove_from_daily_rollup(session: Session, study_session_id: int, user_id: int) -> None:
+    """
+    Subtract a study session's current values from its rollup row, if user_id owns the session.
+    Call before the session row is changed or deleted.
+    """
+    session.connection().exec_driver_sql(
+        ROLLUP_REMOVE_SQL, {'session_id': study_session_id, 'user_id': user_id}
+    )
+
+def rebuild_daily_rollup(session: Session) -> None:
+    """
+    Recompute study_daily_rollup from study_sessions, e.g. after seeding or a bulk import.
+    """
+    session.query(StudyDailyRollup).delete()
+    session.connection().exec_driver_sql(ROLLUP_REBUILD_SQL)
+
+MOOD_SCORE_BACKFILL_SQL = """
+    UPDATE study_sessions
+    SET post_mood_score = CASE post_mood
+        %s
+    END
+    WHERE post_mood IS NOT NULL AND post_mood_score IS NULL
+""" % "\n        ".join(f"WHEN '{mood.name}' THEN {score}" for mood, score in MOOD_SCORES.items())
+
+def backfill_mood_scores(session: Session) -> None:
+    """
+    Fill post_mood_score for study sessions written before the column existed. Run by migrate_db.py.
+    """
+    session.connection().exec_driver_sql(MOOD_SCORE_BACKFILL_SQL)
+
+# Wellness tips are seeded once and rarely change, so they are loaded on first use and
+# bucketed by (stress_level, category) and (stress_level, None).
+_tips_cache: Optional[Dict[Tuple[int, Optional[str]], List[Dict]]] = None
+_tips_lock = threading.Lock()
+
+def _load_wellness_tips(session: Session) -> Dict[Tuple[int, Optional[str]], List[Dict]]:
+    buckets = {}
+    for tip in session.query(WellnessTip).order_by(WellnessTip.id).all():
+        data = {
             "id": tip.id,
             "title": tip.title,
             "content": tip.content,
             "category": tip.category
-        } for tip in query.all()]
+        }
+        for level in range(tip.min_stress_level, tip.max_stress_level + 1):
+            buckets.setdefault((level, None), []).append(data)
+            buckets.setdefault((level, tip.category), []).append(data)
+    return buckets
+
+def clear_wellness_tips_cache() -> None:
+    """
+    Drop the cached wellness tips; call after adding or editing tips.
+    """
+    global _tips_cache
+    with _tips_lock:
+        _tips_cache = None
+
+def get_wellness_tips(stress_level: int, category: Optional[str], session: Session) -> List[Dict]:
+    """
+    Get wellness tips based on stress level and optional category.
+    """
+    global _tips_cache
+    if _tips_cache is None:
+        with _tips_lock:
+            if _tips_cache is None:
+                _tips_cache = _load_wellness_tips(session)
+    
+    tips = _tips_cache.get((stress_level, category.lower() if category else None), [])
     
     # If no tips found for the specific category, try without category filter
     if not tips and category:
-        return get_wellness_tips(stress_level)
+        tips = _tips_cache.get((stress_level, None), [])
         
-    return tips
+    return list(tips)
 
 def generate_study_recommendations(user_id: int, session: Session) -> List[Dict]:
     """
@@ -66,20 +228,24 @@ def generate_study_recommendations(user_id: int, session: Session) -> List[Dict]
     """
     recommendations = []
     
-    # Get user's recent study sessions
-    recent_sessions = session.query(StudySession).filter(
+    # Durations of the user's 5 most recent study sessions
+    recent_sessions = session.query(StudySession.duration).filter(
         StudySession.user_id == user_id
-    ).order_by(StudySession.created_at.desc()).limit(5).all()
+    ).order_by(StudySession.created_at.desc()).limit(5).subquery()
     
-    # Get user's recent wellness entries
-    recent_wellness = session.query(WellnessEntry).filter(
+    # Stress levels of the user's 5 most recent wellness entries
+    recent_wellness = session.query(WellnessEntry.stress_level).filter(
         WellnessEntry.user_id == user_id
-    ).order_by(WellnessEntry.created_at.desc()).limit(5).all()
+    ).order_by(WellnessEntry.created_at.desc()).limit(5).subquery()
+    
+    # Average both in a single round trip; each is None when there are no rows
+    avg_duration, avg_stress = session.query(
+        session.query(func.avg(recent_sessions.c.duration)).scalar_subquery(),
+        session.query(func.avg(recent_wellness.c.stress_level)).scalar_subquery()
+    ).one()
     
     # Analyze study patterns
-    if recent_sessions:
-        avg_duration = sum(s.duration for s in recent_sessions) / len(recent_sessions)
-        
+    if avg_duration is not None:
         if avg_duration > 60:
             recommendations.append({
                 "type": "break",
@@ -89,9 +255,7 @@ def generate_study_recommendations(user_id: int, session: Session) -> List[Dict]
             })
     
     # Analyze mood patterns
-    if recent_wellness:
-        avg_stress = sum(w.stress_level for w in recent_wellness) / len(recent_wellness)
-        
+    if avg_stress is not None:
         if avg_stress > 7:
             recommendations.append({
                 "type": "wellness",
@@ -165,76 +329,125 @@ def calculate_productivity_score(user_id: int, session: Session) -> float:
     
     return min(100, max(0, round(total_score, 2)))
 
-def get_study_analytics(user_id: int, days: int = 7) -> Dict:
+def _average_present(values: List[Optional[float]]) -> Optional[float]:
+    """
+    Average of the non-None values rounded to one decimal, or None if every value is None or 0.
+    """
+    total = 0
+    count = 0
+    for value in values:
+        if value is not None:
+            total += value
+            count += 1
+    return round(total / count, 1) if any(values) else None
+
+def get_study_analytics(user_id: int, days: int, session: Session) -> Dict:
     """
     Get analytics data for the user's study sessions over the specified number of days.
     """
     end_date = datetime.utcnow()
     start_date = end_date - timedelta(days=days-1)
     
-    with Session(engine) as session:
-        # Get daily study time
-        daily_data = session.query(
-            func.date(StudySession.created_at).label('date'),
-            func.sum(StudySession.duration).label('total_duration'),
-            func.avg(StudySession.sentiment_score).label('avg_sentiment')
-        ).filter(
-            StudySession.user_id == user_id,
-            StudySession.created_at >= start_date,
-            StudySession.created_at <= end_date
-        ).group_by('date').order_by('date').all()
-        
-        # Get mood data
-        mood_data = session.query(
-            func.date(WellnessEntry.created_at).label('date'),
-            func.avg(WellnessEntry.stress_level).label('avg_stress'),
-            func.avg(WellnessEntry.energy_level).label('avg_energy')
-        ).filter(
+    # Get daily study time (from the per-day rollup) and mood data in one pass:
+    # both row sets are stacked with UNION ALL and grouped by date together
+    daily_rows = union_all(
+        select(
+            StudyDailyRollup.day.label('date'),
+            StudyDailyRollup.total_duration.label('duration'),
+            StudyDailyRollup.session_count.label('session_count'),
+            StudyDailyRollup.sum_sentiment.label('sum_sentiment'),
+            StudyDailyRollup.sentiment_count.label('sentiment_count'),
+            null().label('stress_level'),
+            null().label('energy_level')
+        ).where(
+            StudyDailyRollup.user_id == user_id,
+            StudyDailyRollup.day >= start_date.date(),
+            StudyDailyRollup.day <= end_date.date()
+        ),
+        select(
+            func.date(WellnessEntry.created_at),
+            literal(0),
+            literal(0),
+            literal(0),
+            literal(0),
+            WellnessEntry.stress_level,
+            WellnessEntry.energy_level
+        ).where(
             WellnessEntry.user_id == user_id,
             WellnessEntry.created_at >= start_date,
             WellnessEntry.created_at <= end_date
-        ).group_by('date').order_by('date').all()
-        
-        # Get subject distribution
-        subjects = session.query(
-            StudySession.subject,
-            func.sum(StudySession.duration).label('total_duration')
-        ).filter(
-            StudySession.user_id == user_id,
-            StudySession.created_at >= start_date,
-            StudySession.created_at <= end_date
-        ).group_by(StudySession.subject).order_by(func.sum(StudySession.duration).desc()).all()
-        
-        # Format data for charts
-        dates = [(start_date + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
-        study_data = {row.date.strftime('%Y-%m-%d'): row.total_duration / 60 for row in daily_data}  # Convert to hours
-        mood_data_dict = {row.date.strftime('%Y-%m-%d'): row.avg_stress for row in mood_data}
-        energy_data_dict = {row.date.strftime('%Y-%m-%d'): row.avg_energy for row in mood_data}
-        
-        # Fill in missing dates with zeros/None
-        study_hours = [study_data.get(date, 0) for date in dates]
-        stress_levels = [mood_data_dict.get(date, None) for date in dates]
-        energy_levels = [energy_data_dict.get(date, None) for date in dates]
-        
-        # Calculate subject distribution
-        subject_labels = [row.subject for row in subjects]
-        subject_hours = [round(row.total_duration / 60, 1) for row in subjects]  # Convert to hours
-        
-        return {
-            'dates': dates,
-            'study_hours': study_hours,
-            'stress_levels': stress_levels,
-            'energy_levels': energy_levels,
-            'subjects': {
-                'labels': subject_labels,
-                'data': subject_hours
-            },
-            'total_study_hours': round(sum(study_hours), 1),
-            'avg_stress': round(sum(filter(None, stress_levels)) / len([s for s in stress_levels if s is not None]), 1) if any(stress_levels) else None,
-            'avg_energy': round(sum(filter(None, energy_levels)) / len([e for e in energy_levels if e is not None]), 1) if any(energy_levels) else None
-        }
+        )
+    ).subquery()
+    
+    daily_data = session.execute(
+        select(
+            daily_rows.c.date,
+            func.sum(daily_rows.c.duration).label('total_duration'),
+            func.sum(daily_rows.c.session_count).label('session_count'),
+            (func.sum(daily_rows.c.sum_sentiment) /
+             func.nullif(func.sum(daily_rows.c.sentiment_count), 0)).label('avg_sentiment'),
+            func.avg(daily_rows.c.stress_level).label('avg_stress'),
+            func.avg(daily_rows.c.energy_level).label('avg_energy')
+        ).group_by(daily_rows.c.date).order_by(daily_rows.c.date)
+    ).all()
+    
+    # Get subject distribution from the per-day rollup
+    subjects = session.execute(
+        select(
+            StudyDailyRollup.subject,
+            func.sum(StudyDailyRollup.total_duration).label('total_duration')
+        ).where(
+            StudyDailyRollup.user_id == user_id,
+            StudyDailyRollup.day >= start_date.date(),
+            StudyDailyRollup.day <= end_date.date()
+        ).group_by(StudyDailyRollup.subject).having(
+            func.sum(StudyDailyRollup.session_count) > 0
+        ).order_by(func.sum(StudyDailyRollup.total_duration).desc())
+    ).all()
+    
+    # Format data for charts
+    base = start_date.date()
+    days_in_range = [base + timedelta(days=i) for i in range(days)]
+    dates = [day.isoformat() for day in days_in_range]
+    
+    # Keyed by the date objects the queries return, so rows need no formatting
+    study_data = {row.date: row.total_duration / 60 for row in daily_data if row.session_count}  # Convert to hours
+    mood_data_dict = {row.date: row.avg_stress for row in daily_data if row.avg_stress is not None}
+    energy_data_dict = {row.date: row.avg_energy for row in daily_data if row.avg_energy is not None}
+    
+    # Fill in missing dates with zeros/None
+    study_hours = [study_data.get(day, 0) for day in days_in_range]
+    stress_levels = [mood_data_dict.get(day, None) for day in days_in_range]
+    energy_levels = [energy_data_dict.get(day, None) for day in days_in_range]
+    
+    # Calculate subject distribution
+    subject_labels = [row.subject for row in subjects]
+    subject_hours = [round(row.total_duration / 60, 1) for row in subjects]  # Convert to hours
+    
+    return {
+        'dates': dates,
+        'study_hours': study_hours,
+        'stress_levels': stress_levels,
+        'energy_levels': energy_levels,
+        'subjects': {
+            'labels': subject_labels,
+            'data': subject_hours
+        },
+        'total_study_hours': round(sum(study_hours), 1),
+        'avg_stress': _average_present(stress_levels),
+        'avg_energy': _average_present(energy_levels)
+    }
 
 # --- IntaSend helpers (SDK first, REST fallback)
+# Shared HTTP session so REST calls reuse pooled keep-alive connections instead of a
+# new TCP+TLS handshake each time. Retry only covers idempotent methods, not POST.
+_http = requests.Session()
+_http.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.2)
+))
+
 USE_SDK = True
 try:
     from intasend import APIService
@@ -258,7 +471,7 @@ def create_checkout(user_email: str, api_ref: str):
             "comment": "MindFit Premium",
             "redirect_url": f"{REDIRECT_HOST}/payment/callback"
         }
-        r = requests.post(url, json=payload, headers=headers, timeout=30)
+        r = _http.post(url, json=payload, headers=headers, timeout=30)
         r.raise_for_status()
         data = r.json()
         return {"url": data.get("url"), "invoice_id": data.get("invoice", {}).get("invoice_id") or data.get("invoice_id")}
@@ -272,6 +485,6 @@ def check_payment_status(invoice_id: str):
         # If using REST, hit the status endpoint (requires auth)
         url = f"https://api.intasend.com/api/v1/checkout/{invoice_id}/"
         headers = {"Authorization": f"Bearer {INTASEND_SECRET_KEY}"}
-        r = requests.get(url, headers=headers, timeout=30)
+        r = _http.get(url, headers=headers, timeout=30)
         r.raise_for_status()
         return r.json()
\ No newline at end of file